@@ -1,7 +1,9 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import dropbox
 from dropbox.exceptions import AuthError, ApiError
-from dropbox.files import WriteMode, CommitInfo, UploadSessionStartResult
+from dropbox.files import WriteMode, CommitInfo, UploadSessionStartResult, UploadSessionCursor, UploadSessionType, UploadSessionFinishArg
+from urllib3.util.retry import Retry
 import os
 import tempfile
 import time
@@ -11,10 +13,20 @@ import uuid
 import mimetypes
 import pandas as pd
 import io
-import base64
 from PIL import Image
 import hashlib
 import re
+import gc
+import contextlib
+import collections
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import blake3
+except ImportError:  # Fall back to hashlib's BLAKE2b
+    blake3 = None
 
 # Set page configuration
 st.set_page_config(
@@ -24,33 +36,104 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Number of entries kept in the upload history
+UPLOAD_HISTORY_LIMIT = 500
+
+# Upload history fields shown in the history table, with their column titles
+HISTORY_COLUMNS = {
+    "file_name": "File",
+    "file_size": "Size",
+    "target_path": "Path",
+    "timestamp": "Time",
+    "status": "Status"
+}
+
+# Icons shown next to upload statuses in the history table; anything else is a failure
+STATUS_ICONS = {
+    "Success": "✅",
+    "Success (dedup)": "✅"
+}
+
+# Minimum seconds between upload progress updates sent to the browser
+PROGRESS_UPDATE_INTERVAL = 0.05
+
+# Concurrent upload tuning
+UPLOAD_WORKERS = 8
+UPLOAD_CHUNK_ALIGNMENT = 4 * 1024 * 1024  # Concurrent sessions need 4MB-aligned appends
+LARGE_FILE_THRESHOLD = 150 * 1024 * 1024  # Largest file Dropbox accepts in a single upload request
+MAX_CHUNKS_IN_FLIGHT = 16  # Upload chunks held in memory at once across all uploads
+
+# Seconds Dropbox account details and folder listings stay cached
+ACCOUNT_CACHE_TTL = 60
+FOLDER_CACHE_TTL = 30
+
+# Bytes read from the start of a CSV file to build its preview
+CSV_PREVIEW_BYTES = 64 * 1024
+
+# Bytes from the start of a file hashed to identify its cached preview
+PREVIEW_KEY_BYTES = 64 * 1024
+
+# Runs of two or more slashes in a path
+_MULTI_SLASH_RE = re.compile(r"/{2,}")
+
+# Units used by format_size, one per power of 1024
+_SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+
+# File icons keyed by lowercase extension
+_ICON_BY_EXT = {
+    ext: icon
+    for icon, extensions in [
+        ("🖼️", ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']),
+        ("📄", ['.pdf']),
+        ("📝", ['.doc', '.docx']),
+        ("📊", ['.xls', '.xlsx']),
+        ("📽️", ['.ppt', '.pptx']),
+        ("🗜️", ['.zip', '.rar', '.7z', '.tar', '.gz']),
+        ("🎵", ['.mp3', '.wav', '.ogg', '.flac']),
+        ("🎬", ['.mp4', '.avi', '.mov', '.wmv']),
+        ("📋", ['.txt', '.md', '.csv']),
+        ("💻", ['.py', '.js', '.html', '.css', '.java', '.cpp']),
+    ]
+    for ext in extensions
+}
+
+# Extensions render_file_preview can render
+_PREVIEWABLE_EXTENSIONS = frozenset([
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp',
+    '.txt', '.md', '.csv', '.json'
+])
+
+# Per-thread Dropbox clients for upload workers
+_thread_local = threading.local()
+
 # Initialize session state variables
 if 'upload_history' not in st.session_state:
-    st.session_state.upload_history = []
+    st.session_state.upload_history = collections.deque(maxlen=UPLOAD_HISTORY_LIMIT)
 if 'current_folder' not in st.session_state:
     st.session_state.current_folder = ""
 if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
 if 'dbx_client' not in st.session_state:
     st.session_state.dbx_client = None
+if 'account_id' not in st.session_state:
+    st.session_state.account_id = None
+if 'upload_hashes' not in st.session_state:
+    st.session_state.upload_hashes = {}  # Dropbox path -> hash of the content last uploaded there
+if 'prefetched' not in st.session_state:
+    st.session_state.prefetched = {}  # fetcher name -> (args, monotonic time) of its last prefetch
 if 'settings' not in st.session_state:
     st.session_state.settings = {
         "max_file_size_mb": 500,
         "allowed_extensions": "*",
-        "chunk_size": 4 * 1024 * 1024,  # 4MB chunks for large file uploads
+        "chunk_size": 16 * 1024 * 1024,  # 16MB chunks; larger files are streamed in chunks
         "create_folders_if_not_exist": True,
         "overwrite_existing": True,
         "save_credentials": False
     }
 
-# Custom CSS
-st.markdown("""
+# Custom CSS, with whitespace collapsed to shrink the payload sent on every rerun
+CUSTOM_CSS = " ".join("""
 <style>
-    .main-header {
-        font-size: 2.5rem;
-        color: #1E88E5;
-        margin-bottom: 1rem;
-    }
     .sub-header {
         font-size: 1.5rem;
         color: #0D47A1;
@@ -134,46 +217,94 @@ st.markdown("""
         background-color: #FFEBEE;
         border-left: 3px solid #F44336;
     }
+    .feature-grid {
+        display: flex;
+        gap: 1rem;
+    }
+    .feature-grid > div {
+        flex: 1;
+    }
 </style>
-""", unsafe_allow_html=True)
+""".split())
+
+# Streamlit drops elements a rerun does not emit, so the styles are sent every run
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+
+# Footer shown on every page
+FOOTER_HTML = """
+<div class="footer">
+    <p>Advanced Dropbox Uploader | Created with Streamlit</p>
+    <p>Version 2.0.0 | Last Updated: May 2023</p>
+</div>
+"""
+
+# Landing page shown before connecting to Dropbox
+WELCOME_HTML = """
+<div class="auth-status auth-disconnected">❌ Not connected to Dropbox</div>
+<div class="info-box">
+    <h3>Welcome to Advanced Dropbox Uploader!</h3>
+    <p>This application allows you to:</p>
+    <ul>
+        <li>Browse your Dropbox files and folders</li>
+        <li>Upload files to Dropbox with progress tracking</li>
+        <li>Create new folders in your Dropbox</li>
+        <li>Preview files before uploading</li>
+        <li>Track upload history</li>
+        <li>Customize upload settings</li>
+    </ul>
+    <p>To get started, please enter your Dropbox API credentials in the sidebar and click "Connect to Dropbox".</p>
+</div>
+<h2 class="sub-header">Key Features</h2>
+<div class="feature-grid">
+    <div>
+        <h3>📂 File Management</h3>
+        <ul>
+            <li>Browse files and folders</li>
+            <li>Create new folders</li>
+            <li>Download files</li>
+            <li>Upload multiple files</li>
+        </ul>
+    </div>
+    <div>
+        <h3>🔍 File Preview</h3>
+        <ul>
+            <li>Preview images</li>
+            <li>Preview text files</li>
+            <li>Preview CSV data</li>
+            <li>File type detection</li>
+        </ul>
+    </div>
+    <div>
+        <h3>⚙️ Advanced Settings</h3>
+        <ul>
+            <li>File type filtering</li>
+            <li>Size limits</li>
+            <li>Folder creation</li>
+            <li>Overwrite options</li>
+        </ul>
+    </div>
+</div>
+<img src="https://www.dropbox.com/static/images/logo_catalog/dropbox_logo_glyph_2015_m1.svg" width="100">
+"""
 
 # Utility functions
 def format_size(size_bytes):
     """Format file size from bytes to human-readable format"""
-    if size_bytes < 1024:
+    # Each unit step is 10 bits, so the bit length picks the unit directly
+    unit = min((size_bytes.bit_length() - 1) // 10, len(_SIZE_UNITS) - 1) if size_bytes > 0 else 0
+    if unit == 0:
         return f"{size_bytes} B"
-    elif size_bytes < 1024 * 1024:
-        return f"{size_bytes / 1024:.2f} KB"
-    elif size_bytes < 1024 * 1024 * 1024:
-        return f"{size_bytes / (1024 * 1024):.2f} MB"
-    else:
-        return f"{size_bytes / (1024 * 1024 * 1024):.2f} GB"
+    return f"{size_bytes / (1 << (10 * unit)):.2f} {_SIZE_UNITS[unit]}"
 
 def get_file_icon(file_name):
     """Return an appropriate icon based on file extension"""
     ext = os.path.splitext(file_name)[1].lower()
-    if ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp']:
-        return "🖼️"
-    elif ext in ['.pdf']:
-        return "📄"
-    elif ext in ['.doc', '.docx']:
-        return "📝"
-    elif ext in ['.xls', '.xlsx']:
-        return "📊"
-    elif ext in ['.ppt', '.pptx']:
-        return "📽️"
-    elif ext in ['.zip', '.rar', '.7z', '.tar', '.gz']:
-        return "🗜️"
-    elif ext in ['.mp3', '.wav', '.ogg', '.flac']:
-        return "🎵"
-    elif ext in ['.mp4', '.avi', '.mov', '.wmv']:
-        return "🎬"
-    elif ext in ['.txt', '.md', '.csv']:
-        return "📋"
-    elif ext in ['.py', '.js', '.html', '.css', '.java', '.cpp']:
-        return "💻"
-    else:
-        return "📁"
+    return _ICON_BY_EXT.get(ext, "📁")
+
+@lru_cache(maxsize=16)
+def _parse_allowed_extensions(allowed_extensions):
+    """Turn the comma-separated allowed extensions setting into a set"""
+    return frozenset(ext.strip().lower() for ext in allowed_extensions.split(','))
 
 def is_valid_file_type(file_name):
     """Check if file type is allowed based on settings"""
@@ -181,19 +312,26 @@ def is_valid_file_type(file_name):
         return True
     
     ext = os.path.splitext(file_name)[1].lower()
-    allowed_extensions = st.session_state.settings["allowed_extensions"].split(',')
-    allowed_extensions = [ext.strip().lower() for ext in allowed_extensions]
-    
-    return ext in allowed_extensions
+    return ext in _parse_allowed_extensions(st.session_state.settings["allowed_extensions"])
 
 def is_valid_file_size(file_size):
     """Check if file size is within the allowed limit"""
     max_size_bytes = st.session_state.settings["max_file_size_mb"] * 1024 * 1024
     return file_size <= max_size_bytes
 
-def get_file_hash(file_content):
-    """Generate a hash of file content for deduplication"""
-    return hashlib.md5(file_content).hexdigest()
+def get_file_hash(file_obj, chunk_size=1024 * 1024):
+    """Generate a hash of file content for deduplication, reading the file in chunks"""
+    if blake3 is not None:
+        file_hash = blake3.blake3(max_threads=blake3.blake3.AUTO)
+    else:
+        file_hash = hashlib.blake2b()
+    
+    file_obj.seek(0)
+    for chunk in iter(lambda: file_obj.read(chunk_size), b""):
+        file_hash.update(chunk)
+    file_obj.seek(0)
+    
+    return file_hash.hexdigest()
 
 def normalize_path(path):
     """Ensure path starts with / and has no double slashes"""
@@ -204,73 +342,91 @@ def normalize_path(path):
     if not path.startswith("/"):
         path = "/" + path
     
-    # Remove double slashes
-    while "//" in path:
-        path = path.replace("//", "/")
-    
-    return path
+    # Collapse repeated slashes in a single pass
+    return _MULTI_SLASH_RE.sub("/", path)
 
-def get_mime_type(file_name):
-    """Get MIME type of a file"""
-    mime_type, _ = mimetypes.guess_type(file_name)
+@lru_cache(maxsize=256)
+def _mime_for_ext(ext):
+    """Guess the MIME type for a lowercase file extension"""
+    mime_type, _ = mimetypes.guess_type("file" + ext)
     if mime_type is None:
         return "application/octet-stream"
     return mime_type
 
+def get_mime_type(file_name):
+    """Get MIME type of a file"""
+    return _mime_for_ext(os.path.splitext(file_name)[1].lower())
+
 def can_preview(file_name):
     """Check if file can be previewed"""
     ext = os.path.splitext(file_name)[1].lower()
-    previewable_extensions = [
-        '.jpg', '.jpeg', '.png', '.gif', '.bmp',
-        '.txt', '.md', '.csv', '.json'
-    ]
-    return ext in previewable_extensions
+    return ext in _PREVIEWABLE_EXTENSIONS
 
-def generate_file_preview(file):
-    """Generate a preview for supported file types"""
-    file_content = file.getvalue()
-    file_ext = os.path.splitext(file.name)[1].lower()
+@st.cache_data(ttl=600, show_spinner=False)
+def _render_file_preview(_file, preview_key):
+    """Render a preview, replayed from cache for the same preview key"""
+    file_ext = os.path.splitext(_file.name)[1].lower()
     
     if file_ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp']:
         try:
-            image = Image.open(io.BytesIO(file_content))
-            # Resize large images for preview
+            image = Image.open(io.BytesIO(_file.getvalue()))
+            # Shrink large images for preview
             max_width = 300
             if image.width > max_width:
                 ratio = max_width / image.width
-                new_height = int(image.height * ratio)
-                image = image.resize((max_width, new_height))
+                preview_size = (max_width, max(1, int(image.height * ratio)))
+                # Let JPEGs decode at reduced scale, then shrink in place
+                image.draft("RGB", preview_size)
+                image.thumbnail(preview_size, Image.Resampling.LANCZOS)
             
-            buffered = io.BytesIO()
-            image.save(buffered, format=image.format)
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            return f'<img src="data:image/{image.format.lower()};base64,{img_str}" style="max-width:100%;">'
+            st.image(image)
         except Exception as e:
-            return f"<p>Error generating image preview: {str(e)}</p>"
+            st.error(f"Error generating image preview: {str(e)}")
     
     elif file_ext in ['.txt', '.md', '.json']:
         try:
-            text_content = file_content.decode('utf-8')
+            text_content = _file.getvalue().decode('utf-8')
             # Limit preview to first 500 characters
             if len(text_content) > 500:
                 text_content = text_content[:500] + "..."
-            return f'<pre style="background-color:#f5f5f5;padding:10px;border-radius:5px;max-height:200px;overflow:auto;">{text_content}</pre>'
+            st.code(text_content, language='json' if file_ext == '.json' else None)
         except Exception as e:
-            return f"<p>Error generating text preview: {str(e)}</p>"
+            st.error(f"Error generating text preview: {str(e)}")
     
     elif file_ext in ['.csv']:
         try:
-            df = pd.read_csv(io.BytesIO(file_content))
-            # Limit preview to first 5 rows
-            preview_df = df.head(5)
-            return f'<div style="max-height:200px;overflow:auto;">{preview_df.to_html(index=False)}</div>'
+            # Parse only the first 5 rows from the start of the file
+            _file.seek(0)
+            head = _file.read(CSV_PREVIEW_BYTES)
+            if _file.size > CSV_PREVIEW_BYTES:
+                # Drop the partial row at the cut so no truncated values are shown
+                head = head[:head.rfind(b"\n") + 1]
+            try:
+                preview_df = pd.read_csv(io.BytesIO(head), nrows=5, engine='c')
+            except (pd.errors.ParserError, pd.errors.EmptyDataError):
+                preview_df = None
+            if preview_df is None or (_file.size > CSV_PREVIEW_BYTES and len(preview_df) < 5):
+                # A quoted field or a whole row runs past the cut; parse from the whole file
+                _file.seek(0)
+                preview_df = pd.read_csv(_file, nrows=5, engine='c')
+            _file.seek(0)
+            st.dataframe(preview_df)
         except Exception as e:
-            return f"<p>Error generating CSV preview: {str(e)}</p>"
+            st.error(f"Error generating CSV preview: {str(e)}")
     
-    return "<p>No preview available for this file type.</p>"
+    else:
+        st.info("No preview available for this file type.")
 
-def add_to_upload_history(file_name, file_size, target_path, status, error_message=None):
-    """Add an entry to the upload history"""
+def render_file_preview(file):
+    """Render a preview for supported file types"""
+    # Key on name, size and a hash of the leading bytes so reruns reuse the preview
+    with file.getbuffer() as buffer:
+        head_hash = hashlib.blake2b(buffer[:PREVIEW_KEY_BYTES]).hexdigest()
+    _render_file_preview(file, (file.name, file.size, head_hash))
+
+def make_history_entry(file_name, file_size, target_path, status, error_message=None):
+    """Build an upload history entry"""
+    # Display strings are formatted once here; rendering the history only reads them
     history_entry = {
         "id": str(uuid.uuid4()),
         "file_name": file_name,
@@ -280,15 +436,28 @@ def add_to_upload_history(file_name, file_size, target_path, status, error_messa
         "status": status,
         "error_message": error_message
     }
-    st.session_state.upload_history.insert(0, history_entry)
-    # Keep only the last 100 entries
-    if len(st.session_state.upload_history) > 100:
-        st.session_state.upload_history = st.session_state.upload_history[:100]
+    return history_entry
+
+def add_to_upload_history(history_entries):
+    """Add a batch of entries, oldest first, to the front of the upload history"""
+    # The deque drops the oldest entries once the limit is reached
+    st.session_state.upload_history.extendleft(history_entries)
+
+def record_upload_result(history_entries, file, target_path, file_hash, success, error_msg=None):
+    """Add a finished upload to history_entries and remember its content hash on success"""
+    if success:
+        # Keyed by path so uploading different content there replaces the old hash
+        st.session_state.upload_hashes[target_path] = file_hash
+        history_entries.append(make_history_entry(file.name, file.size, target_path, "Success"))
+    else:
+        history_entries.append(make_history_entry(file.name, file.size, target_path, "Failed", error_msg))
+    return success
 
 def save_settings():
     """Save current settings to session state"""
     st.session_state.settings["max_file_size_mb"] = max_file_size_mb
     st.session_state.settings["allowed_extensions"] = allowed_extensions
+    st.session_state.settings["chunk_size"] = chunk_size_mb * 1024 * 1024
     st.session_state.settings["create_folders_if_not_exist"] = create_folders_if_not_exist
     st.session_state.settings["overwrite_existing"] = overwrite_existing
     st.session_state.settings["save_credentials"] = save_credentials
@@ -296,29 +465,53 @@ def save_settings():
 
 def clear_upload_history():
     """Clear the upload history"""
-    st.session_state.upload_history = []
+    # Clearing in place keeps the deque and its maxlen
+    st.session_state.upload_history.clear()
     st.success("Upload history cleared!")
 
+def open_folder(path):
+    """Navigate the file browser to a folder"""
+    st.session_state.current_folder = path
+
 def logout():
     """Log out from Dropbox"""
     st.session_state.authenticated = False
     st.session_state.dbx_client = None
+    st.session_state.account_id = None
+    st.session_state.upload_hashes = {}
     st.session_state.current_folder = ""
+    create_dropbox_client.clear()
     st.success("Logged out successfully!")
 
 # Dropbox API functions
+def create_http_session():
+    """Build the pooled HTTP session used by the Dropbox client"""
+    # Sized so concurrent upload workers can all keep their connections alive
+    session = dropbox.create_session(max_connections=UPLOAD_WORKERS + MAX_CHUNKS_IN_FLIGHT)
+    # Retry failed connection attempts with backoff; requests that were already sent are not
+    # retried (all SDK calls are POST), and the SDK itself retries rate limits and 5xx responses
+    session.get_adapter("https://").max_retries = Retry(total=3, backoff_factor=0.3)
+    return session
+
+@st.cache_resource(show_spinner=False)
+def create_dropbox_client(app_key, app_secret, refresh_token):
+    """Build a Dropbox client shared across reruns and sessions using the same credentials"""
+    return dropbox.Dropbox(
+        app_key=app_key,
+        app_secret=app_secret,
+        oauth2_refresh_token=refresh_token,
+        session=create_http_session()
+    )
+
 def get_dropbox_client(app_key, app_secret, refresh_token):
     """Authenticate with Dropbox and return a client instance"""
     try:
-        dbx = dropbox.Dropbox(
-            app_key=app_key,
-            app_secret=app_secret,
-            oauth2_refresh_token=refresh_token
-        )
+        dbx = create_dropbox_client(app_key, app_secret, refresh_token)
         # Test the connection
-        dbx.users_get_current_account()
+        account = dbx.users_get_current_account()
         st.session_state.authenticated = True
         st.session_state.dbx_client = dbx
+        st.session_state.account_id = account.account_id
         return dbx
     except AuthError as e:
         st.error(f"Authentication failed: {e}")
@@ -331,11 +524,40 @@ def get_dropbox_client(app_key, app_secret, refresh_token):
         st.session_state.dbx_client = None
         return None
 
-def list_folder(dbx, path):
+@st.cache_data(ttl=FOLDER_CACHE_TTL, show_spinner=False)
+def fetch_folder_contents(_dbx, account_id, path):
+    """Fetch a Dropbox folder listing as plain dicts, cached per account and path"""
+    # Follow the cursor so the cached listing covers every page
+    result = _dbx.files_list_folder(path)
+    raw_entries = list(result.entries)
+    while result.has_more:
+        result = _dbx.files_list_folder_continue(result.cursor)
+        raw_entries.extend(result.entries)
+    
+    entries = []
+    for entry in raw_entries:
+        if isinstance(entry, dropbox.files.FolderMetadata):
+            entries.append({
+                "type": "folder",
+                "id": entry.id,
+                "name": entry.name,
+                "path_display": entry.path_display
+            })
+        elif isinstance(entry, dropbox.files.FileMetadata):
+            entries.append({
+                "type": "file",
+                "id": entry.id,
+                "name": entry.name,
+                "path_display": entry.path_display,
+                "size": entry.size,
+                "server_modified": entry.server_modified
+            })
+    return entries
+
+def list_folder(dbx, account_id, path):
     """List contents of a Dropbox folder"""
     try:
-        result = dbx.files_list_folder(path)
-        return result.entries
+        return fetch_folder_contents(dbx, account_id, path)
     except ApiError as e:
         if e.error.is_path() and e.error.get_path().is_not_found():
             st.warning(f"Folder not found: {path}")
@@ -367,24 +589,16 @@ def ensure_folder_exists(dbx, path):
     if path == "/" or not path:
         return True
     
-    # Split the path into components
-    components = path.split("/")
-    components = [c for c in components if c]
-    
-    current_path = ""
-    for component in components:
-        current_path += f"/{component}"
-        if not create_folder(dbx, current_path):
-            return False
-    
-    return True
+    # Dropbox creates any missing parent folders along with the leaf
+    return create_folder(dbx, path)
 
-def upload_small_file(dbx, file_content, target_path, overwrite=True):
-    """Upload a small file (< 150MB) to Dropbox"""
+def upload_small_file(dbx, file_obj, target_path, overwrite=True):
+    """Upload a small file (smaller than one chunk) to Dropbox in a single request"""
     try:
         mode = WriteMode.overwrite if overwrite else WriteMode.add
+        file_obj.seek(0)
         result = dbx.files_upload(
-            file_content,
+            file_obj.read(),
             target_path,
             mode=mode
         )
@@ -396,114 +610,412 @@ def upload_small_file(dbx, file_content, target_path, overwrite=True):
         error_msg = str(e)
         return False, error_msg
 
-def upload_large_file(dbx, file_content, target_path, chunk_size, overwrite=True):
-    """Upload a large file (>= 150MB) to Dropbox using chunked upload"""
+def get_thread_client(dbx):
+    """Return a Dropbox client owned by the calling thread, cloned from dbx"""
+    if getattr(_thread_local, "parent", None) is not dbx:
+        _thread_local.parent = dbx
+        # The clone shares dbx's cached HTTP session, so pooled connections outlive the worker
+        _thread_local.client = dbx.clone()
+    return _thread_local.client
+
+@st.cache_resource
+def get_chunk_slots():
+    """Return the process-wide semaphore limiting how many upload chunks are in memory"""
+    return threading.BoundedSemaphore(MAX_CHUNKS_IN_FLIGHT)
+
+# Fetched on the script thread so upload workers share the cached instance
+_chunk_slots = get_chunk_slots()
+
+def append_file_chunks(dbx, file_obj, session_id, chunk_size):
+    """Append a file's content to a concurrent upload session in parallel and close it"""
+    file_size = file_obj.size
+    
+    # Every append except the last must be a multiple of 4MB
+    chunk_size = max(UPLOAD_CHUNK_ALIGNMENT, chunk_size - chunk_size % UPLOAD_CHUNK_ALIGNMENT)
+    
+    offsets = range(0, file_size, chunk_size)
+    read_lock = threading.Lock()
+    
+    def append_chunk(offset, close=False):
+        # Hold a slot from reading the chunk until it has been sent
+        with _chunk_slots:
+            with read_lock:
+                file_obj.seek(offset)
+                chunk = file_obj.read(chunk_size)
+            get_thread_client(dbx).files_upload_session_append_v2(
+                chunk,
+                UploadSessionCursor(session_id=session_id, offset=offset),
+                close=close
+            )
+    
+    # Upload all but the last chunk in parallel; consuming the results re-raises any failure
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        list(executor.map(append_chunk, offsets[:-1]))
+    
+    # A closed session rejects further appends, so the closing chunk goes last
+    append_chunk(offsets[-1], close=True)
+
+def needs_upload_session(file_size, chunk_size):
+    """Check if a file should be streamed in chunks rather than read into memory whole"""
+    return file_size >= min(chunk_size, LARGE_FILE_THRESHOLD)
+
+def start_upload_sessions(dbx, count):
+    """Start several concurrent upload sessions with a single API call"""
     try:
-        file_size = len(file_content)
-        
-        # Start the upload session
-        cursor = dropbox.files.UploadSessionCursor(
-            session_id=dbx.files_upload_session_start(file_content[:chunk_size]).session_id,
-            offset=chunk_size
+        result = dbx.files_upload_session_start_batch(
+            count,
+            session_type=UploadSessionType.concurrent
         )
-        
-        # Upload the file in chunks
-        for i in range(chunk_size, file_size, chunk_size):
-            end = min(i + chunk_size, file_size)
-            
-            # If this is the last chunk, commit the upload
-            if end == file_size:
-                mode = WriteMode.overwrite if overwrite else WriteMode.add
-                commit_info = CommitInfo(path=target_path, mode=mode)
-                dbx.files_upload_session_finish(
-                    file_content[i:end],
-                    cursor,
-                    commit_info
-                )
-            else:
-                # Otherwise, continue the upload session
-                dbx.files_upload_session_append_v2(
-                    file_content[i:end],
-                    cursor
-                )
-                cursor.offset = end
-        
-        return True, None
-    except ApiError as e:
-        error_msg = str(e)
-        return False, error_msg
+        return result.session_ids, None
     except Exception as e:
-        error_msg = str(e)
-        return False, error_msg
+        return None, str(e)
 
-def upload_to_dropbox(dbx, file, target_path, settings):
-    """Upload a file to Dropbox with progress tracking and error handling"""
+def finish_upload_sessions(dbx, sessions, overwrite=True):
+    """Commit closed upload sessions, given as (session_id, file_size, target_path), in a single call"""
+    mode = WriteMode.overwrite if overwrite else WriteMode.add
+    entries = [
+        UploadSessionFinishArg(
+            cursor=UploadSessionCursor(session_id=session_id, offset=file_size),
+            commit=CommitInfo(path=target_path, mode=mode)
+        )
+        for session_id, file_size, target_path in sessions
+    ]
+    
     try:
-        file_content = file.getvalue()
-        file_size = len(file_content)
+        result = dbx.files_upload_session_finish_batch_v2(entries)
+    except Exception as e:
+        return [(False, str(e))] * len(sessions)
+    
+    return [
+        (True, None) if entry.is_success() else (False, str(entry.get_failure()))
+        for entry in result.entries
+    ]
+
+@st.cache_data(ttl=ACCOUNT_CACHE_TTL, show_spinner=False)
+def fetch_account_info(_dbx, account_id):
+    """Fetch account details from Dropbox, cached per account"""
+    account_info = _dbx.users_get_current_account()
+    return {
+        "name": f"{account_info.name.given_name} {account_info.name.surname}",
+        "email": account_info.email,
+        "country": account_info.country,
+        "account_type": account_info.account_type,
+        "profile_photo": account_info.profile_photo_url if hasattr(account_info, 'profile_photo_url') else None
+    }
+
+@st.cache_data(ttl=ACCOUNT_CACHE_TTL, show_spinner=False)
+def fetch_space_usage(_dbx, account_id):
+    """Fetch space usage from Dropbox, cached per account"""
+    space_usage = _dbx.users_get_space_usage()
+    used = space_usage.used
+    allocated = space_usage.allocation.get_individual().allocated
+    
+    return {
+        "used": used,
+        "allocated": allocated,
+        "used_formatted": format_size(used),
+        "allocated_formatted": format_size(allocated),
+        "percentage": (used / allocated) * 100 if allocated > 0 else 0
+    }
+
+@st.cache_resource
+def get_gc_pause_state():
+    """Return the process-wide lock and depth counter shared by gc_paused"""
+    return {"lock": threading.Lock(), "depth": 0}
+
+@contextlib.contextmanager
+def gc_paused():
+    """Disable cyclic garbage collection until every overlapping upload batch has finished"""
+    state = get_gc_pause_state()
+    with state["lock"]:
+        state["depth"] += 1
+        gc.disable()
+    try:
+        yield
+    finally:
+        with state["lock"]:
+            state["depth"] -= 1
+            if state["depth"] == 0:
+                gc.collect()
+                gc.enable()
+
+def upload_with_thread_client(dbx, file, target_path, settings):
+    """Upload a file from a worker thread using that thread's own Dropbox client"""
+    return upload_small_file(get_thread_client(dbx), file, target_path, settings["overwrite_existing"])
+
+def append_chunks_with_thread_client(dbx, file, session_id, chunk_size):
+    """Append a file to an upload session from a worker thread using that thread's own Dropbox client"""
+    try:
+        append_file_chunks(get_thread_client(dbx), file, session_id, chunk_size)
+        return True, None
+    except Exception as e:
+        return False, str(e)
+
+def render_folder_contents(dbx, account_id, path):
+    """Render a Dropbox folder listing with open and download buttons"""
+    with st.spinner("Loading folder contents..."):
+        folder_contents = list_folder(dbx, account_id, path)
+        
+        # Separate folders and files
+        folders = [item for item in folder_contents if item["type"] == "folder"]
+        files = [item for item in folder_contents if item["type"] == "file"]
+        
+        # Sort alphabetically
+        folders.sort(key=lambda x: x["name"].lower())
+        files.sort(key=lambda x: x["name"].lower())
+        
+        # Display folders
+        if folders:
+            st.markdown("### 📁 Folders")
+            for folder in folders:
+                col1, col2 = st.columns([5, 1])
+                with col1:
+                    st.markdown(f'<div class="folder-item">📁 {folder["name"]}</div>', unsafe_allow_html=True)
+                with col2:
+                    st.button(
+                        "Open",
+                        key=f"open_{folder['id']}",
+                        on_click=open_folder,
+                        args=(folder["path_display"],)
+                    )
+        
+        # Display files
+        if files:
+            st.markdown("### 📄 Files")
+            for file in files:
+                col1, col2, col3 = st.columns([4, 1, 1])
+                with col1:
+                    icon = get_file_icon(file["name"])
+                    st.markdown(f'<div class="folder-item">{icon} {file["name"]} ({format_size(file["size"])})</div>', unsafe_allow_html=True)
+                with col2:
+                    st.caption(f"Modified: {file['server_modified'].strftime('%Y-%m-%d')}")
+                with col3:
+                    if st.button("Download", key=f"download_{file['id']}"):
+                        try:
+                            metadata, response = dbx.files_download(file["path_display"])
+                            st.download_button(
+                                label="Save File",
+                                data=response.content,
+                                file_name=file["name"],
+                                mime=get_mime_type(file["name"]),
+                                key=f"save_{file['id']}"
+                            )
+                        except Exception as e:
+                            st.error(f"Error downloading file: {e}")
+        
+        # Empty folder message
+        if not folders and not files:
+            st.info("This folder is empty.")
+
+def prepare_uploads(files, target_folder, history_entries):
+    """Validate files and return the (file, target_path, file_hash) tuples that need uploading
+
+    Rejected files and content already uploaded to the same path are recorded in history_entries.
+    """
+    pending_uploads = []
+    for file in files:
+        file_name = file.name
+        file_size = file.size
         
-        # Check if parent folder exists and create if needed
-        parent_folder = os.path.dirname(target_path)
-        if settings["create_folders_if_not_exist"] and parent_folder:
-            if not ensure_folder_exists(dbx, parent_folder):
-                return False, "Failed to create parent folders"
+        # Construct target path
+        target_path = os.path.join(target_folder, file_name).replace("\\", "/")
+        if not target_path.startswith("/"):
+            target_path = "/" + target_path
         
-        # Choose upload method based on file size
-        if file_size < 150 * 1024 * 1024:  # 150MB
-            success, error_msg = upload_small_file(
-                dbx, 
-                file_content, 
+        # Validate file
+        if not is_valid_file_type(file_name):
+            history_entries.append(make_history_entry(
+                file_name, 
+                file_size, 
                 target_path, 
-                settings["overwrite_existing"]
-            )
-        else:
-            success, error_msg = upload_large_file(
-                dbx, 
-                file_content, 
+                "Failed", 
+                "File type not allowed"
+            ))
+            continue
+        
+        if not is_valid_file_size(file_size):
+            history_entries.append(make_history_entry(
+                file_name, 
+                file_size, 
                 target_path, 
-                settings["chunk_size"], 
-                settings["overwrite_existing"]
-            )
+                "Failed", 
+                f"File exceeds maximum size limit of {st.session_state.settings['max_file_size_mb']} MB"
+            ))
+            continue
         
-        return success, error_msg
-    except Exception as e:
-        return False, str(e)
+        # Skip content already uploaded to this path during the session
+        file_hash = get_file_hash(file)
+        if st.session_state.upload_hashes.get(target_path) == file_hash:
+            history_entries.append(make_history_entry(
+                file_name, 
+                file_size, 
+                target_path, 
+                "Success (dedup)"
+            ))
+            continue
+        
+        pending_uploads.append((file, target_path, file_hash))
+    
+    return pending_uploads
+
+def record_batch_results(dbx, upload_results, settings, history_entries):
+    """Record finished uploads and commit the fully appended upload sessions among them
+
+    upload_results holds (upload, session_id, success, error_msg) tuples, where session_id is None
+    for files uploaded in a single request.
+    """
+    sessions_to_finish = []
+    for upload, session_id, success, error_msg in upload_results:
+        if success and session_id is not None:
+            sessions_to_finish.append((upload, session_id))
+        else:
+            record_upload_result(history_entries, *upload, success, error_msg)
+    
+    if sessions_to_finish:
+        results = finish_upload_sessions(
+            dbx,
+            [(session_id, file.size, target_path) for (file, target_path, _), session_id in sessions_to_finish],
+            settings["overwrite_existing"]
+        )
+        for (upload, _), (success, error_msg) in zip(sessions_to_finish, results):
+            record_upload_result(history_entries, *upload, success, error_msg)
+
+def upload_batch(dbx, uploads, settings, history_entries, on_progress=None):
+    """Upload (file, target_path, file_hash) tuples concurrently and record each result in history_entries
+
+    Files smaller than a chunk are uploaded in one request each. Larger files are appended to a
+    batch of concurrent upload sessions that is committed in a single call once the appends are
+    done. on_progress(finished, message) is called on the calling thread, throttled, as files
+    finish; if it raises because a rerun interrupted the script, everything that was uploaded
+    is still committed and recorded.
+    """
+    # Anything bigger than a chunk is streamed so memory use stays at chunk size
+    chunk_size = settings["chunk_size"]
+    small_uploads = [u for u in uploads if not needs_upload_session(u[0].size, chunk_size)]
+    large_uploads = [u for u in uploads if needs_upload_session(u[0].size, chunk_size)]
+    
+    # Large files share one batch of upload sessions that is committed in a single call
+    session_ids = []
+    if large_uploads:
+        session_ids, error_msg = start_upload_sessions(dbx, len(large_uploads))
+        if session_ids is None:
+            for upload in large_uploads:
+                record_upload_result(history_entries, *upload, False, error_msg)
+            large_uploads, session_ids = [], []
+    
+    # Upload several files at once; results are collected as each one finishes
+    futures = {}
+    upload_results = []
+    finished = 0
+    last_progress_update = 0.0
+    try:
+        with ThreadPoolExecutor(max_workers=min(UPLOAD_WORKERS, len(uploads))) as executor:
+            for upload in small_uploads:
+                file, target_path, _ = upload
+                future = executor.submit(upload_with_thread_client, dbx, file, target_path, settings)
+                futures[future] = (upload, None)
+            for upload, session_id in zip(large_uploads, session_ids):
+                future = executor.submit(
+                    append_chunks_with_thread_client,
+                    dbx,
+                    upload[0],
+                    session_id,
+                    chunk_size
+                )
+                futures[future] = (upload, session_id)
+            
+            for future in as_completed(futures):
+                upload, session_id = futures.pop(future)
+                success, error_msg = future.result()
+                upload_results.append((upload, session_id, success, error_msg))
+                
+                # Appended sessions count as done once they are committed
+                if success and session_id is not None:
+                    continue
+                
+                # Update progress, throttled so quick uploads don't flood the browser
+                finished += 1
+                now = time.monotonic()
+                if on_progress and now - last_progress_update >= PROGRESS_UPDATE_INTERVAL:
+                    on_progress(finished, f"Uploaded {finished}/{len(uploads)}: {upload[0].name}")
+                    last_progress_update = now
+        
+        appended = len(upload_results) - finished
+        if on_progress and appended:
+            on_progress(finished, f"Committing {appended} large files...")
+    finally:
+        # The executor has waited for every upload, so results the loop
+        # did not get to read (because the run was interrupted) are ready
+        for future, (upload, session_id) in futures.items():
+            success, error_msg = future.result()
+            upload_results.append((upload, session_id, success, error_msg))
+        
+        record_batch_results(dbx, upload_results, settings, history_entries)
 
-def get_account_info(dbx):
+def get_account_info(dbx, account_id):
     """Get information about the connected Dropbox account"""
     try:
-        account_info = dbx.users_get_current_account()
-        return {
-            "name": f"{account_info.name.given_name} {account_info.name.surname}",
-            "email": account_info.email,
-            "country": account_info.country,
-            "account_type": account_info.account_type,
-            "profile_photo": account_info.profile_photo_url if hasattr(account_info, 'profile_photo_url') else None
-        }
+        return fetch_account_info(dbx, account_id)
     except Exception as e:
         st.error(f"Error getting account info: {e}")
         return None
 
-def get_space_usage(dbx):
+def get_space_usage(dbx, account_id):
     """Get space usage information for the Dropbox account"""
     try:
-        space_usage = dbx.users_get_space_usage()
-        used = space_usage.used
-        allocated = space_usage.allocation.get_individual().allocated
-        
-        return {
-            "used": used,
-            "allocated": allocated,
-            "used_formatted": format_size(used),
-            "allocated_formatted": format_size(allocated),
-            "percentage": (used / allocated) * 100 if allocated > 0 else 0
-        }
+        return fetch_space_usage(dbx, account_id)
     except Exception as e:
         st.error(f"Error getting space usage: {e}")
         return None
 
+def prefetch_with_thread_client(fetch, dbx, *args):
+    """Call a cached fetcher from a worker thread using that thread's own Dropbox client"""
+    # The client argument is not hashed, so the clone hits the same cache entry
+    return fetch(get_thread_client(dbx), *args)
+
+def prefetch_dropbox_data(dbx, account_id, path):
+    """Warm the account, space usage and folder caches concurrently"""
+    # Skip anything prefetched within its TTL so cache hits don't start a pool on every rerun
+    now = time.monotonic()
+    prefetched = st.session_state.prefetched
+    missing = []
+    for fetch, args, ttl in (
+        (fetch_account_info, (account_id,), ACCOUNT_CACHE_TTL),
+        (fetch_space_usage, (account_id,), ACCOUNT_CACHE_TTL),
+        (fetch_folder_contents, (account_id, path), FOLDER_CACHE_TTL),
+    ):
+        last_args, last_time = prefetched.get(fetch.__name__, (None, None))
+        if last_args != args or now - last_time >= ttl:
+            missing.append((fetch, args))
+    if not missing:
+        return
+    
+    # Worker threads need the script context to use Streamlit's caches
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=len(missing), initializer=add_script_run_ctx, initargs=(None, ctx)) as executor:
+        futures = {
+            executor.submit(prefetch_with_thread_client, fetch, dbx, *args): (fetch, args)
+            for fetch, args in missing
+        }
+    # Failed fetches are not cached, so their errors are reported by the regular calls afterwards
+    for future, (fetch, args) in futures.items():
+        if future.exception() is None:
+            prefetched[fetch.__name__] = (args, now)
+
+def refresh_account_info():
+    """Drop cached account details so they are fetched again"""
+    fetch_account_info.clear()
+    fetch_space_usage.clear()
+    st.session_state.prefetched.pop(fetch_account_info.__name__, None)
+    st.session_state.prefetched.pop(fetch_space_usage.__name__, None)
+
+def refresh_folder_contents():
+    """Drop cached folder listings so they are fetched again"""
+    fetch_folder_contents.clear()
+    st.session_state.prefetched.pop(fetch_folder_contents.__name__, None)
+
 # Main app layout
-st.markdown('<h1 class="main-header">📤 Advanced Dropbox Uploader</h1>', unsafe_allow_html=True)
+st.title("📤 Advanced Dropbox Uploader")
 
 # Sidebar for authentication and settings
 with st.sidebar:
@@ -531,7 +1043,7 @@ with st.sidebar:
             logout()
     
     # Settings section
-    st.markdown('<h2 class="sub-header">Settings</h2>', unsafe_allow_html=True)
+    st.header("Settings")
     
     with st.expander("Upload Settings", expanded=False):
         max_file_size_mb = st.number_input(
@@ -547,6 +1059,15 @@ with st.sidebar:
             help="Enter extensions separated by commas (e.g., .jpg,.pdf,.docx) or * for all files"
         )
         
+        chunk_size_mb = st.number_input(
+            "Chunk Size (MB)", 
+            min_value=4, 
+            max_value=150, 
+            step=4,
+            value=st.session_state.settings["chunk_size"] // (1024 * 1024),
+            help="Files of this size or larger are uploaded in parts of this size (rounded down to a multiple of 4MB)"
+        )
+        
         create_folders_if_not_exist = st.checkbox(
             "Create folders if they don't exist", 
             value=st.session_state.settings["create_folders_if_not_exist"]
@@ -594,15 +1115,24 @@ if st.session_state.authenticated and st.session_state.dbx_client:
     st.markdown('<div class="auth-status auth-connected">✅ Connected to Dropbox</div>', unsafe_allow_html=True)
     
     # Get account info and space usage
-    account_info = get_account_info(st.session_state.dbx_client)
-    space_usage = get_space_usage(st.session_state.dbx_client)
+    if st.button("Refresh Account Info"):
+        refresh_account_info()
+    
+    prefetch_dropbox_data(
+        st.session_state.dbx_client,
+        st.session_state.account_id,
+        st.session_state.current_folder
+    )
+    
+    account_info = get_account_info(st.session_state.dbx_client, st.session_state.account_id)
+    space_usage = get_space_usage(st.session_state.dbx_client, st.session_state.account_id)
     
     # Display account info and space usage
     if account_info and space_usage:
         col1, col2 = st.columns(2)
         
         with col1:
-            st.markdown('<h3 class="sub-header">Account Information</h3>', unsafe_allow_html=True)
+            st.subheader("Account Information")
             st.markdown(f"""
             - **Name:** {account_info['name']}
             - **Email:** {account_info['email']}
@@ -611,7 +1141,7 @@ if st.session_state.authenticated and st.session_state.dbx_client:
             """)
         
         with col2:
-            st.markdown('<h3 class="sub-header">Storage Usage</h3>', unsafe_allow_html=True)
+            st.subheader("Storage Usage")
             st.markdown(f"""
             - **Used:** {space_usage['used_formatted']}
             - **Total:** {space_usage['allocated_formatted']}
@@ -622,7 +1152,7 @@ if st.session_state.authenticated and st.session_state.dbx_client:
             st.caption(f"{space_usage['percentage']:.1f}% used")
     
     # File browser and uploader
-    st.markdown('<h2 class="sub-header">File Browser & Uploader</h2>', unsafe_allow_html=True)
+    st.header("File Browser & Uploader")
     
     # Current path and navigation
     col1, col2 = st.columns([3, 1])
@@ -633,10 +1163,11 @@ if st.session_state.authenticated and st.session_state.dbx_client:
             st.session_state.current_folder = normalize_path(current_path)
     
     with col2:
-        if st.button("Go to Parent Folder"):
-            parent_path = os.path.dirname(st.session_state.current_folder)
-            st.session_state.current_folder = normalize_path(parent_path)
-            st.experimental_rerun()
+        st.button(
+            "Go to Parent Folder",
+            on_click=open_folder,
+            args=(normalize_path(os.path.dirname(st.session_state.current_folder)),)
+        )
     
     # Create new folder
     with st.expander("Create New Folder", expanded=False):
@@ -646,66 +1177,18 @@ if st.session_state.authenticated and st.session_state.dbx_client:
             new_folder_path = normalize_path(new_folder_path)
             
             if create_folder(st.session_state.dbx_client, new_folder_path):
+                # The listing below is rendered later in this run, so clearing the cache is enough
+                refresh_folder_contents()
                 st.success(f"Folder created: {new_folder_path}")
-                time.sleep(1)
-                st.experimental_rerun()
     
     # List folder contents
-    st.markdown('<h3 class="sub-header">Folder Contents</h3>', unsafe_allow_html=True)
+    st.subheader("Folder Contents")
     
-    with st.spinner("Loading folder contents..."):
-        folder_contents = list_folder(st.session_state.dbx_client, st.session_state.current_folder)
-        
-        # Separate folders and files
-        folders = [item for item in folder_contents if isinstance(item, dropbox.files.FolderMetadata)]
-        files = [item for item in folder_contents if isinstance(item, dropbox.files.FileMetadata)]
-        
-        # Sort alphabetically
-        folders.sort(key=lambda x: x.name.lower())
-        files.sort(key=lambda x: x.name.lower())
-        
-        # Display folders
-        if folders:
-            st.markdown("### 📁 Folders")
-            for folder in folders:
-                col1, col2 = st.columns([5, 1])
-                with col1:
-                    st.markdown(f'<div class="folder-item">📁 {folder.name}</div>', unsafe_allow_html=True)
-                with col2:
-                    if st.button("Open", key=f"open_{folder.id}"):
-                        st.session_state.current_folder = folder.path_display
-                        st.experimental_rerun()
-        
-        # Display files
-        if files:
-            st.markdown("### 📄 Files")
-            for file in files:
-                col1, col2, col3 = st.columns([4, 1, 1])
-                with col1:
-                    icon = get_file_icon(file.name)
-                    st.markdown(f'<div class="folder-item">{icon} {file.name} ({format_size(file.size)})</div>', unsafe_allow_html=True)
-                with col2:
-                    st.caption(f"Modified: {file.server_modified.strftime('%Y-%m-%d')}")
-                with col3:
-                    if st.button("Download", key=f"download_{file.id}"):
-                        try:
-                            metadata, response = st.session_state.dbx_client.files_download(file.path_display)
-                            st.download_button(
-                                label="Save File",
-                                data=response.content,
-                                file_name=file.name,
-                                mime=get_mime_type(file.name),
-                                key=f"save_{file.id}"
-                            )
-                        except Exception as e:
-                            st.error(f"Error downloading file: {e}")
-        
-        # Empty folder message
-        if not folders and not files:
-            st.info("This folder is empty.")
+    # Filled after the upload section so files uploaded during this run are listed
+    folder_listing = st.empty()
     
     # File uploader
-    st.markdown('<h2 class="sub-header">Upload Files</h2>', unsafe_allow_html=True)
+    st.header("Upload Files")
     
     # Target folder selection
     target_folder = st.text_input(
@@ -722,32 +1205,35 @@ if st.session_state.authenticated and st.session_state.dbx_client:
     
     if uploaded_files:
         # File preview section
-        st.markdown('<h3 class="sub-header">File Preview</h3>', unsafe_allow_html=True)
+        st.subheader("File Preview")
         
         # Display file information and previews
         for i, file in enumerate(uploaded_files):
-            with st.expander(f"{get_file_icon(file.name)} {file.name} ({format_size(file.getbuffer().nbytes)})", expanded=i==0):
+            size_formatted = format_size(file.size)
+            mime = get_mime_type(file.name)
+            ext_ok = is_valid_file_type(file.name)
+            size_ok = is_valid_file_size(file.size)
+            
+            with st.expander(f"{get_file_icon(file.name)} {file.name} ({size_formatted})", expanded=i==0):
                 col1, col2 = st.columns([1, 2])
                 
                 with col1:
                     st.markdown(f"""
                     **File Details:**
-                    - Size: {format_size(file.getbuffer().nbytes)}
-                    - Type: {get_mime_type(file.name)}
+                    - Size: {size_formatted}
+                    - Type: {mime}
                     """)
                     
                     # Validation warnings
-                    if not is_valid_file_type(file.name):
+                    if not ext_ok:
                         st.warning(f"File type not allowed: {os.path.splitext(file.name)[1]}")
                     
-                    if not is_valid_file_size(file.getbuffer().nbytes):
+                    if not size_ok:
                         st.warning(f"File exceeds maximum size limit of {st.session_state.settings['max_file_size_mb']} MB")
                 
                 with col2:
                     if can_preview(file.name):
-                        st.markdown('<div class="file-preview">', unsafe_allow_html=True)
-                        st.markdown(generate_file_preview(file), unsafe_allow_html=True)
-                        st.markdown('</div>', unsafe_allow_html=True)
+                        render_file_preview(file)
                     else:
                         st.info("No preview available for this file type.")
         
@@ -759,184 +1245,113 @@ if st.session_state.authenticated and st.session_state.dbx_client:
                 # Normalize target folder path
                 target_folder = normalize_path(target_folder)
                 
-                # Create progress bar and status text
-                progress_bar = st.progress(0)
-                status_text = st.empty()
+                # One status container holds the progress bar, status text and final result
+                upload_status = st.status("Uploading files to Dropbox...", expanded=True)
+                progress_bar = upload_status.progress(0)
+                status_text = upload_status.empty()
                 
-                # Process each file
-                successful_uploads = 0
-                failed_uploads = 0
                 total_files = len(uploaded_files)
                 
-                for i, file in enumerate(uploaded_files):
-                    file_name = file.name
-                    file_size = file.getbuffer().nbytes
-                    
-                    # Construct target path
-                    target_path = os.path.join(target_folder, file_name).replace("\\", "/")
-                    if not target_path.startswith("/"):
-                        target_path = "/" + target_path
-                    
-                    # Update status
-                    status_text.text(f"Uploading {i+1}/{total_files}: {file_name}...")
+                # History entries are collected here and added in one go after the batch
+                history_entries = []
+                
+                # Validate files up front so only valid ones are queued for upload
+                pending_uploads = prepare_uploads(uploaded_files, target_folder, history_entries)
+                
+                # Anything recorded below is kept even if a widget interaction interrupts the batch
+                try:
+                    skipped_uploads = sum(entry["status"] == "Failed" for entry in history_entries)
+                    if skipped_uploads:
+                        upload_status.warning(f"Skipped {skipped_uploads} of {total_files} files that exceed the size limit or have a disallowed type.")
                     
-                    # Validate file
-                    if not is_valid_file_type(file_name):
-                        add_to_upload_history(
-                            file_name, 
-                            file_size, 
-                            target_path, 
-                            "Failed", 
-                            "File type not allowed"
-                        )
-                        failed_uploads += 1
-                        continue
+                    # Create the target folder once before any file is uploaded
+                    dbx = st.session_state.dbx_client
+                    upload_settings = st.session_state.settings
+                    if pending_uploads and upload_settings["create_folders_if_not_exist"]:
+                        if not ensure_folder_exists(dbx, target_folder):
+                            for upload in pending_uploads:
+                                record_upload_result(history_entries, *upload, False, "Failed to create parent folders")
+                            pending_uploads = []
                     
-                    if not is_valid_file_size(file_size):
-                        add_to_upload_history(
-                            file_name, 
-                            file_size, 
-                            target_path, 
-                            "Failed", 
-                            f"File exceeds maximum size limit of {st.session_state.settings['max_file_size_mb']} MB"
-                        )
-                        failed_uploads += 1
-                        continue
+                    completed = len(history_entries)
+                    progress_bar.progress(completed / total_files)
                     
-                    # Upload file
-                    success, error_msg = upload_to_dropbox(
-                        st.session_state.dbx_client, 
-                        file, 
-                        target_path, 
-                        st.session_state.settings
-                    )
+                    def show_progress(finished, message):
+                        status_text.text(message)
+                        progress_bar.progress((completed + finished) / total_files)
                     
-                    # Update history
-                    if success:
-                        add_to_upload_history(
-                            file_name, 
-                            file_size, 
-                            target_path, 
-                            "Success"
-                        )
-                        successful_uploads += 1
-                    else:
-                        add_to_upload_history(
-                            file_name, 
-                            file_size, 
-                            target_path, 
-                            "Failed", 
-                            error_msg
-                        )
-                        failed_uploads += 1
+                    if pending_uploads:
+                        status_text.text(f"Uploading {len(pending_uploads)} files...")
+                        # Pause cyclic GC while the batch runs; it is collected once at the end
+                        with gc_paused():
+                            upload_batch(dbx, pending_uploads, upload_settings, history_entries, show_progress)
+                        progress_bar.progress(len(history_entries) / total_files)
+                finally:
+                    add_to_upload_history(history_entries)
+                    successful_uploads = sum(entry["status"] != "Failed" for entry in history_entries)
+                    failed_uploads = len(history_entries) - successful_uploads
                     
-                    # Update progress
-                    progress_bar.progress((i + 1) / total_files)
+                    # Fetch the folder contents fresh on the next run; the history below already
+                    # includes this batch, so no forced rerun is needed
+                    if successful_uploads > 0:
+                        refresh_folder_contents()
                 
                 # Show final status
+                status_text.empty()
                 if successful_uploads == total_files:
-                    st.success(f"Successfully uploaded all {successful_uploads} files to Dropbox!")
+                    upload_status.update(
+                        label=f"Successfully uploaded all {successful_uploads} files to Dropbox!",
+                        state="complete"
+                    )
                 elif successful_uploads > 0:
-                    st.warning(f"Uploaded {successful_uploads} out of {total_files} files. {failed_uploads} files failed.")
+                    upload_status.update(
+                        label=f"Uploaded {successful_uploads} out of {total_files} files. {failed_uploads} files failed.",
+                        state="error"
+                    )
                 else:
-                    st.error(f"Failed to upload any files. Please check the errors and try again.")
-                
-                # Refresh the folder contents
-                time.sleep(1)
-                st.experimental_rerun()
+                    upload_status.update(
+                        label="Failed to upload any files. Please check the errors and try again.",
+                        state="error"
+                    )
+    
+    with folder_listing.container():
+        render_folder_contents(
+            st.session_state.dbx_client,
+            st.session_state.account_id,
+            st.session_state.current_folder
+        )
     
     # Upload history
-    st.markdown('<h2 class="sub-header">Upload History</h2>', unsafe_allow_html=True)
+    st.header("Upload History")
     
     if st.session_state.upload_history:
-        # Clear history button
-        if st.button("Clear History"):
-            clear_upload_history()
-            st.experimental_rerun()
+        # Clear history button; the callback runs before the next run renders the history
+        st.button("Clear History", on_click=clear_upload_history)
         
-        # Display history
-        for entry in st.session_state.upload_history:
-            col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
-            
-            with col1:
-                st.markdown(f"**{entry['file_name']}** ({entry['file_size']})")
-            
-            with col2:
-                st.caption(f"Path: {entry['target_path']}")
-            
-            with col3:
-                st.caption(f"Time: {entry['timestamp']}")
-            
-            with col4:
-                if entry['status'] == "Success":
-                    st.markdown("✅")
-                else:
-                    st.markdown("❌")
-                    if st.button("Details", key=f"details_{entry['id']}"):
-                        st.error(entry['error_message'])
+        # Display history as a single table
+        history_df = pd.DataFrame(list(st.session_state.upload_history))
+        status_icons = history_df["status"].map(STATUS_ICONS).fillna("❌")
+        history_df["status"] = status_icons + " " + history_df["status"]
+        st.dataframe(
+            history_df[list(HISTORY_COLUMNS)].rename(columns=HISTORY_COLUMNS),
+            use_container_width=True
+        )
+        
+        # Error details for a chosen failed upload
+        failed_entries = [entry for entry in st.session_state.upload_history if entry['status'] == "Failed"]
+        if failed_entries:
+            selected_entry = st.selectbox(
+                "Show error for",
+                failed_entries,
+                format_func=lambda entry: f"{entry['file_name']} ({entry['timestamp']})"
+            )
+            st.error(selected_entry['error_message'])
     else:
         st.info("No upload history yet.")
 
 else:
-    # Not authenticated
-    st.markdown('<div class="auth-status auth-disconnected">❌ Not connected to Dropbox</div>', unsafe_allow_html=True)
-    
-    # Welcome message and instructions
-    st.markdown("""
-    <div class="info-box">
-        <h3>Welcome to Advanced Dropbox Uploader!</h3>
-        <p>This application allows you to:</p>
-        <ul>
-            <li>Browse your Dropbox files and folders</li>
-            <li>Upload files to Dropbox with progress tracking</li>
-            <li>Create new folders in your Dropbox</li>
-            <li>Preview files before uploading</li>
-            <li>Track upload history</li>
-            <li>Customize upload settings</li>
-        </ul>
-        <p>To get started, please enter your Dropbox API credentials in the sidebar and click "Connect to Dropbox".</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Features showcase
-    st.markdown('<h2 class="sub-header">Key Features</h2>', unsafe_allow_html=True)
-    
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.markdown("""
-        ### 📂 File Management
-        - Browse files and folders
-        - Create new folders
-        - Download files
-        - Upload multiple files
-        """)
-    
-    with col2:
-        st.markdown("""
-        ### 🔍 File Preview
-        - Preview images
-        - Preview text files
-        - Preview CSV data
-        - File type detection
-        """)
-    
-    with col3:
-        st.markdown("""
-        ### ⚙️ Advanced Settings
-        - File type filtering
-        - Size limits
-        - Folder creation
-        - Overwrite options
-        """)
-    
-    # Demo image
-    st.image("https://www.dropbox.com/static/images/logo_catalog/dropbox_logo_glyph_2015_m1.svg", width=100)
+    # Not authenticated: status, welcome message and feature overview in one element
+    st.markdown(WELCOME_HTML, unsafe_allow_html=True)
 
 # Footer
-st.markdown("""
-<div class="footer">
-    <p>Advanced Dropbox Uploader | Created with Streamlit</p>
-    <p>Version 2.0.0 | Last Updated: May 2023</p>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(FOOTER_HTML, unsafe_allow_html=True)